@@ -21,8 +21,9 @@ import os
 import re
 import sys
 
-functionsPattern = re.compile('(\w*\s*\w+)\s\**\s*(\w+)\([\w*,\s\(\).\[\]]+\)[\s\w,\(\)]*(;|\s#ifndef)')
-variablesPattern = re.compile('extern[\s\w]+?\**(\w+)[\[\d\]]*;')
+functionsPattern = re.compile(r'(\w*\s*\w+)\s\**\s*(\w+)\([\w*,\s\(\).\[\]]+\)[\s\w,\(\)]*(;|\s#ifndef)')
+variablesPattern = re.compile(r'extern[\s\w]+?\**(\w+)[\[\d\]]*;')
+versionScriptPattern = re.compile(r'(?<!})\s+(\w+);')
 
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser(description=""" The check-api script checks if all the exported functions/variables
@@ -35,7 +36,9 @@ if __name__ == "__main__":
     missingSymbols = {}
 
     with open(args.version_script) as fData:
-        versionScriptSymbols = re.findall('(?<!})\s+(\w+);', fData.read())
+        versionScriptSymbols = versionScriptPattern.findall(fData.read())
+    versionScriptSet = set(versionScriptSymbols)
+    foundSymbols = set()
 
     for root, dirs, files in os.walk(args.src_dir):
         if not root.endswith("include"):
@@ -44,31 +47,30 @@ if __name__ == "__main__":
             contents = ""
             with open(os.path.join(root, f)) as fData:
                 contents = fData.read()
-            headerExportedFunctions = functionsPattern.findall(contents)
-            headerExportedFunctions = list(filter(lambda symbol: False if "return" in symbol[0] or
-                                                  "inline" in symbol[0] else True, headerExportedFunctions))
-
             exportedSymbols = variablesPattern.findall(contents)
-            exportedSymbols = exportedSymbols + list(map(lambda symbol: symbol[1], headerExportedFunctions))
+            for match in functionsPattern.finditer(contents):
+                qualifiers = match.group(1)
+                if "return" in qualifiers or "inline" in qualifiers:
+                    continue
+                exportedSymbols.append(match.group(2))
 
             for exported in exportedSymbols:
                 if exported.startswith("SOL_FLOW_PACKET_TYPE_"): #A lovely whitelist <3
                     continue
-                if not exported in versionScriptSymbols:
-                    if not f in missingSymbols:
-                        missingSymbols[f] = [exported]
-                    else:
-                        missingSymbols[f].append(exported)
+                if not exported in versionScriptSet:
+                    missingSymbols.setdefault(f, []).append(exported)
                 else:
-                    versionScriptSymbols.remove(exported)
+                    foundSymbols.add(exported)
+
+    unusedSymbols = [symbol for symbol in versionScriptSymbols if not symbol in foundSymbols]
 
     if len(missingSymbols):
         print("Symbols that were not found at '%s'\n\n" % (args.version_script))
         for key in missingSymbols:
             print("\nFile: %s - Missing symbols: %s" % (key, missingSymbols[key]))
         exitWithErr = True
-    if len(versionScriptSymbols):
-        print("\n\nSymbols declared at '%s' that were not found in the exported headers: %s" % (args.version_script, versionScriptSymbols))
+    if len(unusedSymbols):
+        print("\n\nSymbols declared at '%s' that were not found in the exported headers: %s" % (args.version_script, unusedSymbols))
         exitWithErr = True
 
     if exitWithErr:
@@ -21,13 +21,21 @@ import os
 import re
 import json
 import argparse
+import types
 
 fbpTargetRegex = re.compile(r'(.+)\$\((.+)\)(-deps)? := \\?\s?(.+fbp)')
 nodeTypeRegex = re.compile(r'\w+\(([a-zA-Z0-9-_]+).*?\).*?')
 declaredTypesRegex = re.compile('DECLARE=(.+):(.+):(.+)')
-problems = {'missing_makefiles': [], 'missing_deps': {}}
+confFileRegex = re.compile(r'(.+)\$\((.+)\)-conffile := \\?\s?(.*json)')
+commentRegex = re.compile('^#.*', re.M)
+kConfigEntryRegex = re.compile(r'^(?:menu)?config\s+', re.M)
+
+def getNodeTypesFromJson(path, cache={}):
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if key in cache:
+        return cache[key]
 
-def getNodeTypesFromJson(path):
     nodeAlias = {}
     with open(path, 'r') as f:
         jsonContent = json.load(f)
@@ -37,33 +45,58 @@ def getNodeTypesFromJson(path):
         if idx != -1:
             t = t[:idx]
         nodeAlias[node['name']] = t
-    return nodeAlias
+    # samples sharing a conffile share this mapping, keep it read-only
+    cache[key] = types.MappingProxyType(nodeAlias)
+    return cache[key]
+
+def parseKconfig(kConfigContent):
+    kConfigDeps = {}
+    for entry in kConfigEntryRegex.split(kConfigContent)[1:]:
+        key, _, body = entry.partition('\n')
+        start = body.find('depends')
+        if start == -1:
+            kConfigDeps[key.strip()] = []
+            continue
+        end = body.find('default', start)
+        if end == -1:
+            end = body.find('\n', start)
+        deps = body[start:end].replace('depends on', '').lower().split('&&')
+        deps = [dep.strip() for dep in deps]
+        kConfigDeps[key.strip()] = [dep for dep in deps if dep != 'FLOW_FBP_GENERATOR_SAMPLES']
+    return kConfigDeps
+
+def dirPrefix(path):
+    return path if path.endswith(os.sep) else path + os.sep
 
 def getSamplesData(path):
     samplesData = {}
-    with open(os.path.join(path, 'Makefile'), 'r') as f:
+    pathPrefix = dirPrefix(path)
+    with open(pathPrefix + 'Makefile', 'r') as f:
         makeFileContent = f.read()
-    with open(os.path.join(path, 'Kconfig'), 'r') as f:
-        kConfigContent = f.read()
+    with open(pathPrefix + 'Kconfig', 'r') as f:
+        kConfigDeps = parseKconfig(f.read())
+
+    confFiles = {}
+    for target, kConfigKey, conf in confFileRegex.findall(makeFileContent):
+        confFiles.setdefault((target.strip(), kConfigKey.strip()), conf.strip())
 
     matches = fbpTargetRegex.findall(makeFileContent)
     for match in matches:
         kConfigKey = match[1].strip()
         fbp = match[3].strip()
-        start = kConfigContent.index(kConfigKey)
-        deps = kConfigContent[kConfigContent.index('depends', start) :
-                              kConfigContent.index('default', start)].replace('depends on', '').lower().split('&&')
-        deps = list(filter(lambda x: x != 'FLOW_FBP_GENERATOR_SAMPLES', map(lambda x : x.strip(), deps)))
-        samplesData[fbp] = {'deps' : deps, 'node_aliases': { } }
-        conf = re.search(match[0].strip() +'\$\(' + kConfigKey + '\)-conffile := \\\\?\\s?(.*json)', makeFileContent)
+        if kConfigKey not in kConfigDeps:
+            raise ValueError("Sample '%s' depends on Kconfig symbol '%s', which is not declared in %sKconfig" %
+                             (pathPrefix + fbp, kConfigKey, pathPrefix))
+        samplesData[fbp] = {'deps' : kConfigDeps[kConfigKey], 'node_aliases': { } }
+        conf = confFiles.get((match[0].strip(), kConfigKey))
         if conf is not None:
-            samplesData[fbp]['node_aliases'] = getNodeTypesFromJson(os.path.join(path, conf.groups()[0].strip()))
+            samplesData[fbp]['node_aliases'] = getNodeTypesFromJson(pathPrefix + conf)
     return samplesData
 
 def getNodeData(path):
     with open(path, 'r') as f:
         #Skip comments
-        fbpContent = re.sub('^#.*', '', f.read(), 0, re.M).strip()
+        fbpContent = commentRegex.sub('', f.read()).strip()
     #Skip declares
     lastDeclare = fbpContent.rfind('DECLARE')
     if lastDeclare > -1:
@@ -93,33 +126,37 @@ def getNodeData(path):
         elif t == 'fbp':
             toRemove.append(declaredType[0].strip())
             extraFbps.append(declaredType[2].strip())
-    return (list(filter(lambda x: False if x in toRemove else True, nodes)), extraFbps, extraDeps)
-
-def hasDep(deps, node):
-    for dep in deps:
-        if node in dep:
-            return True
-    return False
+    return ([node for node in nodes if node not in toRemove], extraFbps, extraDeps)
 
-def checkFbpDeps(rootPath, samplesData, fbpFiles):
+def checkFbpDeps(rootPath, samplesData, fbpFiles, missingDeps, visited=None):
+    if visited is None:
+        visited = set()
+    rootPrefix = dirPrefix(rootPath)
     for fbp in fbpFiles:
-        if fbp not in samplesData:
+        if fbp not in samplesData or fbp in visited:
             continue
-        fbpPath = os.path.join(rootPath, fbp)
+        visited.add(fbp)
+        fbpPath = rootPrefix + fbp
         nodeData = getNodeData(fbpPath)
-        nodes = list(map(lambda x: samplesData[fbp]['node_aliases'][x].lower() if x in samplesData[fbp]['node_aliases'] else x.lower(),nodeData[0]))
+        nodeAliases = samplesData[fbp]['node_aliases']
+        nodes = [nodeAliases.get(node, node).lower() for node in nodeData[0]]
         #Extra deps.
         if len(nodeData[2]) > 0:
             nodes.extend(nodeData[2])
         #Declared FBPs
         if len(nodeData[1]) > 0:
             for child in nodeData[1]:
-                samplesData[child] = samplesData[fbp]
-            checkFbpDeps(rootPath, samplesData, nodeData[1])
-        missing = list(filter(lambda x: hasDep(samplesData[fbp]['deps'], x.replace('-', '_')) == False, nodes))
+                if child not in visited:
+                    samplesData[child] = samplesData[fbp]
+            checkFbpDeps(rootPath, samplesData, nodeData[1], missingDeps,
+                         visited)
+        # a node is covered if its name is part of any dependency symbol;
+        # joining them lets a single substring search cover all of them
+        deps = '\n'.join(samplesData[fbp]['deps'])
+        missing = [node for node in nodes if node.replace('-', '_') not in deps]
         if len(missing) == 0:
             continue
-        problems['missing_deps'][fbpPath] = missing
+        missingDeps[fbpPath] = missing
 
 def loadBlackList(path):
     with open(path, 'r') as f:
@@ -140,8 +177,11 @@ if __name__ == "__main__":
     blackList = loadBlackList(args.samples_dependency_check_skip_list)
     if len(blackList) > 0:
         print('Skipping dependency check for FBPs:' + str(blackList))
+    blackList = frozenset(blackList)
+
+    problems = {'missing_makefiles': [], 'missing_deps': {}}
     for root, dirs, files in os.walk(args.samples_root_dir):
-        fbpFiles = list(filter(lambda x: x.endswith('.fbp') and x not in blackList, files))
+        fbpFiles = [f for f in files if f.endswith('.fbp') and f not in blackList]
         if len(fbpFiles) == 0:
             continue
         try:
@@ -150,7 +190,7 @@ if __name__ == "__main__":
             problems['missing_makefiles'].append(root)
             continue
 
-        checkFbpDeps(root, samplesData, fbpFiles)
+        checkFbpDeps(root, samplesData, fbpFiles, problems['missing_deps'])
 
     if len(problems['missing_makefiles']) > 0:
         print('---- Start missing makefiles ----')
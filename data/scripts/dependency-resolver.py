@@ -16,23 +16,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+# modules needed by a single check type or helper are imported in the
+# function using them, so a run served from the cache doesn't load them
 import argparse
 import json
 import logging
 import os
 import pickle
-import platform
-import re
-import socket
 import subprocess
 import sys
-import tempfile
+import threading
 import shlex
 from shutil import which, move
 
 default_compiler = "gcc"
 cstub = "{headers}\nint main(int argc, char **argv){{\n {fragment} return 0;\n}}"
 log_disclaimer = "This file was generated by Soletta's dependency resolver script to help debugging configuration issues."
+# pkg-config version constraints, in order of precedence
+pkgconfig_ver_flags = (("exact-version", "--exact-version"),
+                       ("atleast-version", "--atleast-version"),
+                       ("max-version", "--max-version"))
+# compile tests are short lived, keep them in memory unless told otherwise
+compile_test_dir = "/dev/shm" if not os.environ.get("TMPDIR") and \
+                   os.access("/dev/shm", os.W_OK | os.X_OK) else None
 
 class DepContext:
     def __init__(self, config_log):
@@ -40,6 +46,7 @@ class DepContext:
         self.makefile_vars = {}
         self.log_file = config_log
         self.logger = None
+        self.inputs = None
 
     def add_kconfig(self, k, t, v):
         self.kconfig[k] = {"value": v, "type": t}
@@ -118,50 +125,122 @@ class DepContext:
         self.logger_init()
         self.logger.info(msg, *args, **kargs)
 
-def run_command(cmd, context):
+class CheckContext:
+    """Stands in for the DepContext while a check runs in a worker thread.
+
+    Reads go straight to the wrapped context; log messages and updates are
+    recorded and only applied by replay(), so checks running concurrently
+    still show up in config.log and Makefile.gen in their original order.
+    """
+    def __init__(self, context):
+        self.context = context
+        self.calls = []
+
+    def record(name):
+        def method(self, *args, **kargs):
+            self.calls.append((name, args, kargs))
+        return method
+
+    add_kconfig = record("add_kconfig")
+    add_append_makefile_var = record("add_append_makefile_var")
+    add_cond_makefile_var = record("add_cond_makefile_var")
+    debug = record("debug")
+    info = record("info")
+    del record
+
+    def find_makefile_var(self, v):
+        return self.context.find_makefile_var(v)
+
+    def replay(self):
+        for name, args, kargs in self.calls:
+            getattr(self.context, name)(*args, **kargs)
+        self.calls = []
+
+def run_command(argv, context, input=None):
+    context.debug("Command: %s", " ".join(argv))
     try:
-        context.debug("Command: %s", cmd)
-        output = subprocess.check_output(cmd, stderr=subprocess.STDOUT,
-                                         shell=True, universal_newlines=True)
-        context.debug("Command output(stdout):\n%s", output if output else "None")
-        return output.replace("\n", "").strip(), True
-    except subprocess.CalledProcessError as e:
-        context.debug("exit code: %s", e.returncode)
-        context.debug("Command output(stderr):\n%s", e.output)
-        return e.output, False
+        proc = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              input=input, universal_newlines=True)
+    except OSError as e:
+        context.debug("Could not run command: %s", e)
+        return str(e), False
+
+    output = proc.stdout
+    if proc.returncode != 0:
+        context.debug("exit code: %s", proc.returncode)
+        context.debug("Command output(stderr):\n%s", output)
+        return output, False
+
+    context.debug("Command output(stdout):\n%s", output if output else "None")
+    return output.replace("\n", "").strip(), True
+
+# modules known to each pkg-config command, filled by pkgconfig_modules()
+_pkgconfig_modules = {}
+_pkgconfig_lock = threading.Lock()
+
+def pkgconfig_modules(pkg_config, context):
+    # one --list-all answers for every package that isn't installed, which
+    # is what most checks end up asking about; None if it can't be used
+    key = tuple(pkg_config)
+    modules = _pkgconfig_modules
+    with _pkgconfig_lock:
+        if key in modules:
+            return modules[key]
+
+        context.debug("Command: %s", " ".join(pkg_config + ["--list-all"]))
+        try:
+            proc = subprocess.run(pkg_config + ["--list-all"], stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL, universal_newlines=True)
+        except OSError as e:
+            context.debug("Could not run command: %s", e)
+            proc = None
+
+        if proc and proc.returncode == 0:
+            modules[key] = frozenset(line.split(None, 1)[0]
+                                     for line in proc.stdout.splitlines() if line.strip())
+        else:
+            modules[key] = None
+
+        return modules[key]
+
+def handle_have_not_found(args, conf, context):
+    context.add_kconfig("HAVE_%s" % conf["dependency"].upper(), "bool", "n")
+    return False
 
 def handle_pkgconfig_check(args, conf, context):
     dep = conf["dependency"].upper()
     pkg = conf["pkgname"]
-    atleast_ver = conf.get("atleast-version")
-    max_ver = conf.get("max-version")
-    exact_ver = conf.get("exact-version")
+    pkg_config = shlex.split(args.pkg_config)
     ver_match = True
 
-    if exact_ver:
-        cmd = "%s --exact-version=%s %s" % (args.pkg_config, exact_ver, pkg)
-        result, status = run_command(cmd, context)
-        if not status:
-            ver_match = False
-    elif atleast_ver:
-        cmd = "%s --atleast-version=%s %s" % (args.pkg_config, atleast_ver, pkg)
-        result, status = run_command(cmd, context)
-        if not status:
-            ver_match = False
-    elif max_ver:
-        cmd = "%s --max-version=%s %s" % (args.pkg_config, max_ver, pkg)
-        result, status = run_command(cmd, context)
-        if not status:
-            ver_match = False
+    # only a list of plain module names can be looked up in --list-all,
+    # anything with a version constraint is left to pkg-config itself
+    modules = None
+    if not any(c in pkg for c in ",<>=!"):
+        modules = pkgconfig_modules(pkg_config, context)
+    if modules is not None and not all(m in modules or "%s-uninstalled" % m in modules
+                                       for m in pkg.split()):
+        context.debug("Package %s is not known to pkg-config", pkg)
+        ver_match = False
+    else:
+        for key, flag in pkgconfig_ver_flags:
+            ver = conf.get(key)
+            if ver:
+                cmd = pkg_config + ["%s=%s" % (flag, ver), pkg]
+                result, ver_match = run_command(cmd, context)
+                break
 
     cflags_stat = None
     ldflags_stat = None
     if ver_match:
-        cflags_cmd = "%s --cflags %s" % (args.pkg_config, pkg)
-        ldflags_cmd = "%s --libs %s" % (args.pkg_config, pkg)
+        cflags_cmd = pkg_config + ["--cflags", pkg]
+        ldflags_cmd = pkg_config + ["--libs", pkg]
 
-        cflags, cflags_stat = run_command(cflags_cmd, context)
+        # --cflags resolves at least the same requirements --libs does, so
+        # there is no point in asking for cflags once --libs has failed
         ldflags, ldflags_stat = run_command(ldflags_cmd, context)
+        if ldflags_stat:
+            cflags, cflags_stat = run_command(cflags_cmd, context)
 
         if cflags_stat:
             context.add_cond_makefile_var("%s_CFLAGS" % dep, cflags)
@@ -173,27 +252,48 @@ def handle_pkgconfig_check(args, conf, context):
             context.add_cond_makefile_var("%s_REQUIRES_PRIVATE" % dep, pkg)
 
     success = (cflags_stat or ldflags_stat) and ver_match
-    have_var = "y" if success else "n"
-    context.add_kconfig("HAVE_%s" % dep, "bool", have_var)
+    if not success:
+        return handle_have_not_found(args, conf, context)
 
+    context.add_kconfig("HAVE_%s" % dep, "bool", "y")
     return success
 
-def compile_test(source, compiler, cflags, ldflags):
-    f = tempfile.NamedTemporaryFile(suffix=".c",delete=False)
-    f.write(bytes(source, 'UTF-8'))
-    f.close()
-    output = "%s-bin" % f.name
-    cmd = "{compiler} {cflags} {src} -o {out} {ldflags}".format(compiler=compiler,
-            cflags=cflags, ldflags=ldflags or "", src=f.name, out=output)
+# outcome of each distinct compile test, filled by compile_test()
+_compile_test_results = {}
+
+def compile_test(source, compiler, cflags, ldflags, context):
+    key = (source, compiler, cflags, ldflags)
+    results = _compile_test_results
+    if key in results:
+        context.debug("Reusing result of previous compile test: %s", results[key])
+        return results[key]
+
+    import tempfile
+
+    # the source goes through stdin, only the linked binary needs a file;
+    # "-x none" keeps any object or archive in ldflags from being taken as C
+    fd, output = tempfile.mkstemp(suffix="-bin", dir=compile_test_dir)
+    os.close(fd)
+    cmd = shlex.split(compiler) + shlex.split(cflags) + \
+          ["-x", "c", "-", "-x", "none", "-o", output] + shlex.split(ldflags or "")
     context.debug("Compiling source code:\n%s", source)
-    out, status = run_command(cmd, context)
-    if os.path.exists(output):
+    out, status = run_command(cmd, context, source)
+    try:
         os.unlink(output)
-    os.unlink(f.name)
+    except FileNotFoundError:
+        pass
 
+    results[key] = status
     return status
 
-def set_makefile_compflags(flags, prefix, suffix):
+def syntax_test(source, compiler, cflags, context):
+    cmd = shlex.split(compiler) + shlex.split(cflags) + ["-fsyntax-only", "-x", "c", "-"]
+    context.debug("Checking source code syntax:\n%s", source)
+    out, status = run_command(cmd, context, source)
+
+    return status
+
+def set_makefile_compflags(flags, prefix, suffix, context):
     append_to = flags.get("append_to")
     flag_value = flags.get("value")
 
@@ -208,7 +308,6 @@ def set_makefile_compflags(flags, prefix, suffix):
 
 def handle_ccode_check(args, conf, context):
     dep = conf["dependency"].upper()
-    source = ""
 
     cflags = conf.get("cflags", {})
     ldflags = conf.get("ldflags", {})
@@ -216,11 +315,8 @@ def handle_ccode_check(args, conf, context):
     defines = conf.get("defines", [])
     headers = conf.get("headers", [])
 
-    for define in defines:
-        source += "#define %s\n" % define
-
-    for header in headers:
-        source += "#include %s\n" % header
+    source = "".join(["#define %s\n" % define for define in defines] +
+                     ["#include %s\n" % header for header in headers])
 
     common_cflags = context.find_makefile_var(args.common_cflags_var)
     common_ldflags = context.find_makefile_var(args.common_ldflags_var)
@@ -230,21 +326,40 @@ def handle_ccode_check(args, conf, context):
 
     fragment = conf.get("fragment") or ""
     source = cstub.format(headers=source, fragment=fragment)
-    success = compile_test(source, args.compiler, (" ").join(test_cflags),
-                           (" ").join(test_ldflags))
-
-    if success:
-        context.add_kconfig("HAVE_%s" % dep, "bool", "y")
-        if cflags:
-            set_makefile_compflags(cflags, dep, "CFLAGS")
-        if ldflags:
-            set_makefile_compflags(ldflags, dep, "LDFLAGS")
+    # checking that headers are usable needs neither code generation nor
+    # linking, anything using flags or a fragment still gets a full build
+    if headers and not fragment and not cflags and not ldflags:
+        success = syntax_test(source, args.compiler, (" ").join(test_cflags),
+                              context)
     else:
-        context.add_kconfig("HAVE_%s" % dep, "bool", "n")
+        success = compile_test(source, args.compiler, (" ").join(test_cflags),
+                               (" ").join(test_ldflags), context)
+
+    if not success:
+        return handle_have_not_found(args, conf, context)
+
+    context.add_kconfig("HAVE_%s" % dep, "bool", "y")
+    if cflags:
+        set_makefile_compflags(cflags, dep, "CFLAGS", context)
+    if ldflags:
+        set_makefile_compflags(ldflags, dep, "LDFLAGS", context)
 
     return success
 
 
+def handle_exec_not_found(args, conf, context):
+    dep_sym = conf.get("dependency").upper()
+
+    if conf.get("required"):
+        req_label = context.find_makefile_var("NOT_FOUND")
+        req_label += "executable: %s" % conf.get("exec")
+        context.add_append_makefile_var("NOT_FOUND", req_label)
+
+    context.add_cond_makefile_var(dep_sym, None)
+    context.add_kconfig("HAVE_%s" % dep_sym, "bool", "n")
+
+    return False
+
 def handle_exec_check(args, conf, context):
     dep = conf.get("dependency")
     dep_sym = dep.upper()
@@ -263,13 +378,19 @@ def handle_exec_check(args, conf, context):
     path = which(exe)
     required = conf.get("required")
 
-    if exact_ver or max_ver or atleast_ver:
-        if not cmd:
-            context.info("Could not parse dependency: %s, version requested "
-                "but no version-command to fetch it was specified.", dep)
-            exit(1)
+    versioned = exact_ver or max_ver or atleast_ver
+    if versioned and not cmd:
+        context.info("Could not parse dependency: %s, version requested "
+            "but no version-command to fetch it was specified.", dep)
+        exit(1)
+
+    if not path:
+        return handle_exec_not_found(args, conf, context)
 
-        result, status = run_command(cmd, context)
+    if versioned:
+        # version-command comes from the dependencies file and may rely
+        # on shell syntax, so it is the one command still run by a shell
+        result, status = run_command(["/bin/sh", "-c", cmd], context)
         if not status:
             ver_match = False
         elif (exact_ver and result != exact_ver) or \
@@ -278,60 +399,58 @@ def handle_exec_check(args, conf, context):
             version = result
             ver_match = False
 
-    if required:
-        if not path:
-            req_label = context.find_makefile_var("NOT_FOUND")
-            req_label += "executable: %s" % exe
-            context.add_append_makefile_var("NOT_FOUND", req_label)
-        elif not ver_match:
-            req_label = context.find_makefile_var("NOT_FOUND")
-            req_label += "%s version: %s" % (exe, version)
-            context.add_append_makefile_var("NOT_FOUND", req_label)
+    if required and not ver_match:
+        req_label = context.find_makefile_var("NOT_FOUND")
+        req_label += "%s version: %s" % (exe, version)
+        context.add_append_makefile_var("NOT_FOUND", req_label)
 
     context.add_cond_makefile_var(dep_sym, path)
 
-    success = bool(path) and ver_match
-
-    if success:
+    if ver_match:
         dir_path = os.path.dirname(os.path.realpath("%s" % path))
         context.add_cond_makefile_var("%s_DIR" % dep_sym, dir_path)
 
-    context.add_kconfig("HAVE_%s" % dep_sym, "bool", "y" if success else "n")
+    context.add_kconfig("HAVE_%s" % dep_sym, "bool", "y" if ver_match else "n")
 
-    return success
+    return ver_match
+
+def handle_python_not_found(args, conf, context):
+    if conf.get("required", False):
+        req_label = context.find_makefile_var("NOT_FOUND")
+        req_label += "python%s module: %s\\n" % (sys.version_info[0], conf.get("pkgname"))
+        context.add_append_makefile_var("NOT_FOUND", req_label, True)
+
+    context.add_cond_makefile_var("HAVE_PYTHON_%s" % conf.get("dependency").upper(), "n")
+
+    return False
 
 def handle_python_check(args, conf, context):
+    import importlib.util
+
     dep = conf.get("dependency")
-    required = conf.get("required", False)
     pkgname = conf.get("pkgname")
 
     if not pkgname:
         context.info("Could not parse dependency: %s, no pkgname specified.", dep)
         exit(1)
 
-    source = "import %s" % pkgname
-
-    f = tempfile.NamedTemporaryFile(suffix=".py",delete=False)
-    f.write(bytes(source, 'UTF-8'))
-    f.close()
-
-    cmd = "%s %s" % (sys.executable, f.name)
-    context.debug("Testing python code:\n%s", source)
-    output, status = run_command(cmd, context)
-
-    success = bool(status)
+    # the resolver runs on the same interpreter as the build scripts, so
+    # look the module up in-process instead of spawning a new python
+    context.debug("Looking up python module: %s", pkgname)
+    try:
+        success = importlib.util.find_spec(pkgname) is not None
+    except (ImportError, ValueError) as e:
+        context.debug("Module lookup failed: %s", e)
+        success = False
 
-    if required and not success:
-        req_label = context.find_makefile_var("NOT_FOUND")
-        req_label += "python%s module: %s\\n" % (sys.version_info[0], pkgname)
-        context.add_append_makefile_var("NOT_FOUND", req_label, True)
+    if not success:
+        return handle_python_not_found(args, conf, context)
 
-    context.add_cond_makefile_var("HAVE_PYTHON_%s" % dep.upper(), "y" if success else "n")
-    os.unlink(f.name)
+    context.add_cond_makefile_var("HAVE_PYTHON_%s" % dep.upper(), "y")
 
     return success
 
-def test_file_path(path, files):
+def test_file_path(path, files, context):
     files_len = len(files)
     for curr in files:
         exists = os.path.exists(os.path.join(path, curr))
@@ -351,8 +470,7 @@ def handle_filesystem_check(args, conf, context):
     for k,v in context.makefile_vars.items():
         variables[k] = v["value"]
 
-    dest = path
-    vars_expand(dest, variables, len(dest))
+    vars_expand(path, variables)
 
     found_path = None
     for k,v in path.items():
@@ -360,18 +478,17 @@ def handle_filesystem_check(args, conf, context):
         if not curr_path:
             context.debug("Variable $%s is not set", v)
             continue
-        r = test_file_path(curr_path, files)
+        r = test_file_path(curr_path, files, context)
         if r:
             found_path = os.path.abspath(curr_path)
             break
 
-    if found_path:
-        context.add_kconfig("HAVE_%s" % dep.upper(), "bool", "y")
-        context.add_cond_makefile_var("%s_PATH" % dep.upper(), found_path)
-        return True
-    else:
-        context.add_kconfig("HAVE_%s" % dep.upper(), "bool", "n")
-        return False
+    if not found_path:
+        return handle_have_not_found(args, conf, context)
+
+    context.add_kconfig("HAVE_%s" % dep.upper(), "bool", "y")
+    context.add_cond_makefile_var("%s_PATH" % dep.upper(), found_path)
+    return True
 
 def handle_flags_check(args, conf, context, cflags, ldflags):
     append_to = conf.get("append_to")
@@ -392,23 +509,29 @@ def handle_flags_check(args, conf, context, cflags, ldflags):
         """
         return compile_test(source, args.compiler,
                            " ".join(["-Werror"] + local_cflags),
-                           " ".join(local_ldflags))
+                           " ".join(local_ldflags), context)
 
     if flags_compile(cflags, ldflags):
         context.add_append_makefile_var(append_to,
                                         " ".join(cflags + ldflags))
         return True
 
-    supported_cflags = []
-    for ci in cflags:
-        # must acumulate the tested one so we handle dependent flags like -Wformat*
-        if flags_compile(supported_cflags + [ci], []):
-            supported_cflags.append(ci)
-
-    supported_ldflags = []
-    for cl in ldflags:
-        if flags_compile(supported_ldflags + [cl], []):
-            supported_ldflags.append(cl)
+    def flags_probe(flags, supported):
+        """Helper returning which of flags build on top of the supported
+           ones, bisecting the list so that a few bad flags in a long list
+           only cost a logarithmic number of compiler runs.
+        """
+        if not flags or flags_compile(supported + flags, []):
+            return flags
+        if len(flags) == 1:
+            return []
+        # must acumulate the tested ones so we handle dependent flags like -Wformat*
+        half = len(flags) // 2
+        left = flags_probe(flags[:half], supported)
+        return left + flags_probe(flags[half:], supported + left)
+
+    supported_cflags = flags_probe(cflags, [])
+    supported_ldflags = flags_probe(ldflags, [])
 
     if supported_cflags or supported_ldflags:
         context.add_append_makefile_var(append_to,
@@ -423,6 +546,20 @@ def handle_cflags_check(args, conf, context):
 def handle_ldflags_check(args, conf, context):
     return handle_flags_check(args, conf, context, None, conf.get("ldflags"))
 
+def handle_flags_not_found(args, conf, context):
+    # unsupported flags are simply left out, there is nothing to publish
+    return False
+
+# Every entry of the dependencies config, in both "pre-dependencies" and
+# "dependencies", has:
+#   "dependency": name, upper cased for the symbols the check publishes
+#   "type":       one of the type_handlers keys below
+#   "required":   optional, a missing dependency fails the configuration
+#   "depends":    optional list of dependency names that must be found for
+#                 the check to run; each must name a pre-dependency or an
+#                 earlier entry of the same list. If any of them is missing
+#                 the check is skipped and reported as not found
+# the remaining keys are specific to each check type.
 type_handlers = {
     "pkg-config": handle_pkgconfig_check,
     "ccode": handle_ccode_check,
@@ -433,27 +570,50 @@ type_handlers = {
     "filesystem": handle_filesystem_check,
 }
 
+# what each check type publishes when its dependency is missing, for checks
+# that are skipped without being run
+not_found_handlers = {
+    "pkg-config": handle_have_not_found,
+    "ccode": handle_have_not_found,
+    "exec": handle_exec_not_found,
+    "python": handle_python_not_found,
+    "cflags": handle_flags_not_found,
+    "ldflags": handle_flags_not_found,
+    "filesystem": handle_have_not_found,
+}
+
 def format_makefile_var(items):
-    output = ""
-    for k,v in sorted(items):
-        if not v or not v["value"]: continue
-        output += "%s %s %s\n" % (k, v["attrib"], v["value"].replace('#', '\\#'))
-    return output
+    return "".join("%s %s %s\n" % (k, v["attrib"], v["value"].replace('#', '\\#'))
+                   for k,v in sorted(items) if v and v["value"])
+
+def write_file(path, data, mode="w"):
+    import tempfile
+
+    # write next to the target and rename it over, so an interrupted run
+    # never leaves a truncated file behind that make takes as up to date
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                               prefix=".%s." % os.path.basename(path))
+    f = os.fdopen(fd, mode)
+    try:
+        with f:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp, 0o666 & ~umask)
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
 def makefile_gen(args, context):
     output = format_makefile_var(context.get_makefile_vars().items())
-    f = open(args.makefile_output, "w+")
-    f.write(output)
-    f.close()
+    write_file(args.makefile_output, output)
 
 def kconfig_gen(args, context):
-    output = ""
-    for k,v in sorted(context.get_kconfig().items()):
-        output += "config {config}\n{indent}{ktype}\n{indent}default {enabled}\n". \
-                  format(config=k, indent="       ", ktype=v["type"], enabled=v["value"])
-    f = open(args.kconfig_output, "w+")
-    f.write(output)
-    f.close()
+    output = "".join("config {config}\n{indent}{ktype}\n{indent}default {enabled}\n".
+                     format(config=k, indent="       ", ktype=v["type"], enabled=v["value"])
+                     for k,v in sorted(context.get_kconfig().items()))
+    write_file(args.kconfig_output, output)
 
 def is_verbose():
     flag = os.environ.get("V")
@@ -466,51 +626,154 @@ def is_verbose():
     finally:
         return flag
 
-def run(args, dep_checks, context):
-    verbose = is_verbose()
+def is_independent_check(dep):
+    # required checks build up NOT_FOUND from its current value, filesystem
+    # checks expand every known makefile var and flags checks append to
+    # shared flags: those must see the effects of the checks before them
+    if dep.get("required"):
+        return False
+    if dep["type"] == "ccode":
+        return not any(isinstance(dep.get(k), dict) and dep[k].get("append_to")
+                       for k in ("cflags", "ldflags"))
+    return dep["type"] in ("pkg-config", "exec", "python")
+
+def check_workers():
+    # workers mostly sit waiting on a child process, so keep one extra
+    # check in flight per CPU this process is actually allowed to run on
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return cpus * 2
 
-    for dep in dep_checks:
-        context.debug("Testing dependency: %s, type: %s", dep["dependency"], dep["type"])
-        handler = type_handlers.get(dep["type"])
-        if not handler:
-            context.info("Parsing %s.", args.dep_config.name)
-            context.info("Invalid type: %s at: %s", dep["type"], dep)
-            exit(1)
+def run_check(args, dep, handler, context):
+    result = handler(args, dep, context)
+    context.debug("##########################################################")
+    return result
 
-        result = handler(args, dep, context)
-        context.debug("##########################################################")
+def run(args, dep_checks, context, found):
+    from concurrent.futures import ThreadPoolExecutor
+
+    verbose = is_verbose()
+    pending = []
 
+    def report(dep, result):
+        found[dep["dependency"]] = bool(result)
         if verbose:
             s = "Checking for %s%s... %s" % (dep["dependency"],
                                 " (optional)" if not dep.get("required") else "",
                                 "found." if result else "not found.")
             context.info(s)
 
-def vars_expand(origin, dest, maxrec):
-    remaining = {}
-
-    if not maxrec:
-        return
+    def flush_pending():
+        for dep, check_context, future in pending:
+            future.exception()
+            check_context.replay()
+            report(dep, future.result())
+        del pending[:]
+
+    # checks are mostly spent waiting on the compiler or pkg-config, so
+    # independent ones are run concurrently and applied back in order
+    with ThreadPoolExecutor(max_workers=check_workers()) as executor:
+        for dep in dep_checks:
+            handler = type_handlers.get(dep["type"])
+            depends = dep.get("depends", [])
+            if any(d not in found for d in depends):
+                flush_pending()
+            for d in depends:
+                if d not in found:
+                    context.info("Parsing %s.", args.dep_config)
+                    context.info("Dependency %s depends on %s, which isn't checked "
+                                 "before it", dep["dependency"], d)
+                    exit(1)
+
+            # there is no point in probing for something whose own
+            # dependencies are already known to be missing
+            missing = [d for d in depends if not found.get(d)]
+            if handler and missing:
+                flush_pending()
+                context.debug("Skipping dependency: %s, it depends on: %s",
+                              dep["dependency"], ", ".join(missing))
+                report(dep, not_found_handlers[dep["type"]](args, dep, context))
+                continue
+
+            if handler and is_independent_check(dep):
+                check_context = CheckContext(context)
+                check_context.debug("Testing dependency: %s, type: %s", dep["dependency"], dep["type"])
+                future = executor.submit(run_check, args, dep, handler, check_context)
+                pending.append((dep, check_context, future))
+                continue
+
+            flush_pending()
+            context.debug("Testing dependency: %s, type: %s", dep["dependency"], dep["type"])
+            if not handler:
+                context.info("Parsing %s.", args.dep_config)
+                context.info("Invalid type: %s at: %s", dep["type"], dep)
+                exit(1)
+
+            report(dep, run_check(args, dep, handler, context))
+
+        flush_pending()
+
+def vars_expand(origin, dest):
+    import re
+    import string
+    from collections import deque
+
+    formatter = string.Formatter()
+    deps = {}
 
     for k,v in origin.items():
         if not isinstance(v, str):
             dest[k] = v
             continue
 
+        fields = set()
+        for literal, field, spec, conversion in formatter.parse(v):
+            if field:
+                fields.add(re.split(r"[.\[]", field, maxsplit=1)[0])
+        deps[k] = set(f for f in fields
+                      if f != k and isinstance(origin.get(f), str))
+
+    # expand in dependency order; entries referencing something unknown, or
+    # being part of a cycle, are left out of dest
+    dependents = {}
+    for k,fields in deps.items():
+        for field in fields:
+            dependents.setdefault(field, []).append(k)
+
+    ready = deque(k for k,fields in deps.items() if not fields)
+    while ready:
+        k = ready.popleft()
         try:
-            dest[k] = re.sub("//*", "/", (v.format(**dest)))
+            dest[k] = re.sub("//*", "/", (origin[k].format(**dest)))
         except KeyError:
-            remaining[k] = v
+            continue
 
-    if remaining:
-        vars_expand(remaining, dest, maxrec - 1)
+        for dependent in dependents.get(k, ()):
+            deps[dependent].discard(k)
+            if not deps[dependent]:
+                ready.append(dependent)
+
+def cache_inputs(args):
+    # everything the checks' outcome depends on, a cache made with anything
+    # else is stale; the config itself is tracked by its mtime so a cache hit
+    # still doesn't need to read it
+    try:
+        dep_config_mtime = os.stat(args.dep_config).st_mtime_ns
+    except OSError:
+        dep_config_mtime = None
+
+    return (args.compiler, args.cflags, args.ldflags, args.pkg_config,
+            os.path.abspath(args.dep_config), dep_config_mtime)
 
 def cache_persist(args, context):
-    cache = open(args.cache, "wb")
-    pickle.dump(context, cache, pickle.HIGHEST_PROTOCOL)
-    cache.close()
+    write_file(args.cache, pickle.dumps(context, pickle.HIGHEST_PROTOCOL), "wb")
 
 def log_environment(context):
+    import platform
+    import socket
+
     context.debug("%s\n", log_disclaimer)
     context.debug("## -------- ##")
     context.debug("## Platform ##")
@@ -550,7 +813,7 @@ if __name__ == "__main__":
     parser.add_argument("--makefile-output", help="The makefile fragment output file",
                         type=str, default="Makefile.gen")
     parser.add_argument("--dep-config", help="The dependencies config file",
-                        type=argparse.FileType("r"), default="data/jsons/dependencies.json")
+                        type=str, default="data/jsons/dependencies.json")
     parser.add_argument("--common-cflags-var", help=("The makefile variable to "
                                                      "group common cflags"),
                         type=str, default="COMMON_CFLAGS")
@@ -572,12 +835,18 @@ if __name__ == "__main__":
         exit(1)
 
     context = None
-    conf = json.loads(args.dep_config.read())
+    inputs = cache_inputs(args)
     if os.path.isfile(args.cache):
-        cache = open(args.cache, "rb")
-        context = pickle.load(cache)
-        cache.close()
-    else:
+        with open(args.cache, "rb") as cache:
+            context = pickle.load(cache)
+        if getattr(context, "inputs", None) != inputs:
+            context = None
+
+    if context is None:
+        # the dependencies config is only needed to run the checks, a
+        # cached context already holds everything the generators use
+        with open(args.dep_config, "r") as f:
+            conf = json.load(f)
         dep_checks = conf.get("dependencies")
         pre_checks = conf.get("pre-dependencies")
 
@@ -588,18 +857,21 @@ if __name__ == "__main__":
         context.debug("## Core tests ##")
         context.debug("## ---------- ##\n\n")
 
-        run(args, pre_checks, context)
+        # outcome of every check so far, by dependency name, so that a
+        # check can depend on any pre-dependency or earlier dependency
+        found = {}
+        run(args, pre_checks, context, found)
 
         context.debug("## ---------------- ##")
         context.debug("## Dependency tests ##")
         context.debug("## ---------------- ##\n\n")
 
-        run(args, dep_checks, context)
+        run(args, dep_checks, context, found)
+        context.inputs = inputs
         cache_persist(args, context)
 
     if args.makefile_gen:
         makefile_gen(args, context)
-        cache_persist(args, context)
 
     if args.kconfig_gen:
         kconfig_gen(args, context)
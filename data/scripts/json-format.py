@@ -44,7 +44,7 @@ else:
         os.rename(args.output, bkp)
     outfile = open(args.output, "w")
 
-# Workaround for Python < 3.4
-# In those versions a trailing whitespace is added at the end of each line
-data = json.dumps(data, indent=True, sort_keys=True).replace(' \n','\n') + "\n";
-outfile.write(data)
+# Explicit separators: before Python 3.4 the default item separator
+# left a trailing whitespace at the end of each line
+json.dump(data, outfile, indent=True, sort_keys=True, separators=(',', ': '))
+outfile.write("\n")
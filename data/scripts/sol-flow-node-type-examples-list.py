@@ -29,30 +29,46 @@
 import json
 import os
 import re
-from os import walk
+
+node_regex = re.compile("[(](?P<name>[^):]+)[):]")
+
+def find_files(top, suffix):
+    # like walking the tree with os.walk(), but scandir's entries already
+    # say whether they're directories, so nothing has to be stat'ed
+    found = []
+    dirs = [top]
+    while dirs:
+        with os.scandir(dirs.pop()) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        dirs.append(entry.path)
+                elif entry.name.endswith(suffix):
+                    found.append(entry.path)
+    return found
 
 # TODO - handle types used by conf files
 def get_examples(src_dir, path_index):
     examples = {}
-    fbp_files = []
-
-    for (dirpath, dirnames, filenames) in walk(src_dir):
-        for filename in filenames:
-            if filename.endswith(".fbp"):
-                fbp_files.append(os.path.join(dirpath, filename))
 
-    for fbp_file in fbp_files:
+    for fbp_file in find_files(src_dir, ".fbp"):
+        nodes = set()
         with open(fbp_file, "r") as f:
-            content = f.read()
-            # skip error tests
-            if "TEST-EXPECTS-ERROR" in content:
-                continue
-            for line in content.splitlines():
-                nodes = re.findall("[(](?P<name>[^):]+)[):]", line)
-                for node in nodes:
-                    fbp_url = fbp_file[path_index:]
-                    node_files = examples.setdefault(node, set())
-                    node_files.add(fbp_url)
+            for line in f:
+                # skip error tests, the marker may come after any node
+                if "TEST-EXPECTS-ERROR" in line:
+                    nodes = None
+                    break
+                # node declarations always have parentheses
+                if "(" not in line:
+                    continue
+                nodes.update(node_regex.findall(line))
+
+        if not nodes:
+            continue
+        fbp_url = fbp_file[path_index:]
+        for node in nodes:
+            examples.setdefault(node, set()).add(fbp_url)
 
     return examples
 
@@ -75,7 +91,7 @@ def print_description(outfile, description, infile, examples):
     modules = description.keys()
     if len(modules) != 1:
         print("Warning: a single module is expected per file. Skiping %s" %
-              infile.name)
+              infile)
         return
 
     for module in sorted(description.keys()):
@@ -85,18 +101,10 @@ def print_description(outfile, description, infile, examples):
 def create_doc(outfile, src_dir, desc_dir):
     examples = get_examples(src_dir, len(src_dir))
 
-    json_files = []
-    for (dirpath, dirnames, filenames) in walk(desc_dir):
-        for filename in filenames:
-            if filename.endswith(".json"):
-                infile = os.path.join(dirpath, filename)
-                json_files.append(infile)
-
-    for infile in sorted(json_files):
-        fd = open(infile)
-        description = json.load(fd)
-        print_description(outfile, description, fd, examples)
-        fd.close()
+    for infile in sorted(find_files(desc_dir, ".json")):
+        with open(infile, "rb") as f:
+            description = json.loads(f.read())
+        print_description(outfile, description, infile, examples)
 
 
 if __name__ == "__main__":
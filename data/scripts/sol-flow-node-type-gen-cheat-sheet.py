@@ -26,12 +26,11 @@
 #   src/lib/flow/builtins.json src/modules/flow/*.json
 
 import json
-import re
 
 last_category = None
 
-def writeln(outfile, string):
-    outfile.write(re.sub('_', '\_', string))
+def escape(string):
+    return string.replace('_', '\\_')
 
 def print_header(outfile):
     outfile.write("""\
@@ -61,7 +60,7 @@ def print_header(outfile):
 
 """)
 
-def print_option(outfile, option):
+def print_option(parts, option):
     string = """\
 \\item \\small \\texttt{%(name)s}{\\scriptsize (%(data_type)s)}: %(description)s
 """ % {
@@ -69,16 +68,16 @@ def print_option(outfile, option):
     "data_type": option["data_type"],
     "description": option["description"],
     }
-    writeln(outfile,string)
+    parts.append(escape(string))
 
     value = option.get("default")
     if value:
         string = """ \
         Default Value: %s
 """ % str(option["default"])
-        writeln(outfile, string)
+        parts.append(escape(string))
 
-def print_port(outfile, port):
+def print_port(parts, port):
     string = """\
 \\item \\small \\texttt{%(name)s}{\\scriptsize (%(data_type)s)}: %(description)s
 """ % {
@@ -86,12 +85,14 @@ def print_port(outfile, port):
     "data_type": port["data_type"],
     "description": port["description"],
     }
-    writeln(outfile, string)
+    parts.append(escape(string))
 
 def print_node_type(outfile, node_type):
     global last_category
+    # a node's output is gathered and written at once
+    parts = []
     if last_category != node_type["category"]:
-        outfile.write("""\\marginnote{\\begin{turn}{90}\\colorbox{black}{\\color{white}%s}\\end{turn}}""" % node_type["category"])
+        parts.append("""\\marginnote{\\begin{turn}{90}\\colorbox{black}{\\color{white}%s}\\end{turn}}""" % node_type["category"])
         last_category = node_type["category"]
 
     string = """\
@@ -104,20 +105,20 @@ def print_node_type(outfile, node_type):
     "category": node_type["category"],
     "description": node_type["description"],
     }
-    writeln(outfile, string)
+    parts.append(escape(string))
 
     options = node_type.get("options")
     if options:
         members = options.get("members")
         if members:
-            outfile.write("""\
+            parts.append("""\
 \\item \\small Options:
 \\begin{itemize}
 \\setlength\\itemsep{0em}
 """)
             for option in members:
-                print_option(outfile, option)
-            outfile.write("""\
+                print_option(parts, option)
+            parts.append("""\
 \\end{itemize}
 """)
 
@@ -125,48 +126,50 @@ def print_node_type(outfile, node_type):
     out_ports = node_type.get("out_ports")
 
     if in_ports and out_ports:
-        outfile.write("""\\begin{minipage}[t]{0.4\\textwidth}""")
+        parts.append("""\\begin{minipage}[t]{0.4\\textwidth}""")
 
     if in_ports:
-        outfile.write("""\
+        parts.append("""\
 \\item \\small Input Ports:
 \\begin{itemize}
 \\setlength\\itemsep{0em}
 """)
         for port in in_ports:
-            print_port(outfile, port)
-        outfile.write("""\
+            print_port(parts, port)
+        parts.append("""\
 \\end{itemize}
 """)
 
     if in_ports and out_ports:
-        outfile.write("""\\end{minipage}\\hfill\\begin{minipage}[t]{0.4\\textwidth}""")
+        parts.append("""\\end{minipage}\\hfill\\begin{minipage}[t]{0.4\\textwidth}""")
 
     if out_ports:
-        outfile.write("""\
+        parts.append("""\
 \\item \\small Output Ports:
 \\begin{itemize}
 \\setlength\\itemsep{0em}
 """)
         for port in out_ports:
-            print_port(outfile, port)
-        outfile.write("""\
+            print_port(parts, port)
+        parts.append("""\
 \\end{itemize}
 """)
 
     if in_ports and out_ports:
-        outfile.write("""\\end{minipage}""")
+        parts.append("""\\end{minipage}""")
 
-    outfile.write("""\
+    parts.append("""\
 \\end{itemize}
 """)
 
+    outfile.write("".join(parts))
+
 
 def print_description(outfile, description, infile):
     modules = description.keys()
     if len(modules) != 1:
         print("Warning: a single module is expected per file. Skiping %s" %
-              infile.name)
+              infile)
         return
 
     for module in description.keys():
@@ -185,7 +188,8 @@ def print_foot(outfile):
 def create_cheat_sheet(outfile, infiles):
     print_header(outfile)
     for infile in infiles:
-        description = json.load(infile)
+        with open(infile, "rb") as f:
+            description = json.loads(f.read())
         print_description(outfile, description, infile)
     print_foot(outfile)
 
@@ -198,7 +202,7 @@ if __name__ == "__main__":
                         type=argparse.FileType('w'))
     parser.add_argument("inputs_list", nargs='+',
                         help="List of input description files in JSON format",
-                        type=argparse.FileType('r'))
+                        type=str)
 
     args = parser.parse_args()
     create_cheat_sheet(args.cheat_sheet, args.inputs_list)
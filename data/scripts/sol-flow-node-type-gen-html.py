@@ -29,6 +29,8 @@ import os
 import re
 from os import walk
 
+node_regex = re.compile(r"\(.*?\)")
+
 # TODO - handle types used by conf files
 def get_svgs(svg_dir, path_index):
     svgs = {}
@@ -42,17 +44,17 @@ def get_svgs(svg_dir, path_index):
     for fbp_file in fbp_files:
         with open(fbp_file, "r") as f:
             for line in f:
-                nodes = re.findall("\(.*?\)", line)
+                # node declarations always have parentheses
+                if "(" not in line:
+                    continue
+                nodes = node_regex.findall(line)
                 for node in nodes:
                     # if it hasn't options, find will return -1, required to
                     # remove ')'.
                     type_end = node.find(':')
                     node = node[1:type_end]
-                    node_files = svgs.get(node, [])
-                    fbp_url = fbp_file[path_index:]
-                    if fbp_url not in node_files:
-                        node_files.append(fbp_url)
-                        svgs[node] = node_files
+                    node_files = svgs.setdefault(node, set())
+                    node_files.add(fbp_file[path_index:])
 
     return svgs
 
@@ -149,7 +151,7 @@ def print_node_type(outfile, node_type, svgs, group_id):
 
     examples = svgs.get(node_type["name"])
     if examples:
-        for example in examples:
+        for example in sorted(examples):
             print_example(outfile, example)
 
     outfile.write("""\
@@ -165,7 +167,7 @@ def print_description(outfile, description, infile, svgs):
     modules = description.keys()
     if len(modules) != 1:
         print("Warning: a single module is expected per file. Skiping %s" %
-              infile.name)
+              infile)
         return
 
     for module in description.keys():
@@ -196,7 +198,8 @@ PLACEHOLDER = "<!-- PLACEHOLDER -->\n"
 
 def create_nodes(outfile, infiles, svgs):
     for infile in infiles:
-        description = json.load(infile)
+        with open(infile, "rb") as f:
+            description = json.loads(f.read())
         print_description(outfile, description, infile, svgs)
 
 def create_doc(template, outfile, svg_dir, infiles):
@@ -228,7 +231,7 @@ if __name__ == "__main__":
                         type=str)
     parser.add_argument("inputs_list", nargs='+',
                         help="List of input description files in JSON format",
-                        type=argparse.FileType('r'))
+                        type=str)
 
     args = parser.parse_args()
 
@@ -21,6 +21,7 @@ import json
 import sys
 import traceback
 import re
+from string import Template
 from collections import OrderedDict
 
 def merge_ref(directory, definitions, ref_link):
@@ -50,10 +51,13 @@ def expand_json_schema(directory, schema):
 
 
 def load_json_schema(directory, path, schemas={}):
-    if path in schemas:
-        return schemas[path]
+    # the same file name may show up in more than one schema directory
+    key = (directory, path)
+    if key in schemas:
+        return schemas[key]
 
-    data = json.load(open(os.path.join(directory, path), "r", encoding='UTF-8'))
+    with open(os.path.join(directory, path), "r", encoding='UTF-8') as fp:
+        data = json.load(fp)
     if not data['$schema'].startswith("http://json-schema.org/"):
         raise ValueError("not a JSON schema")
 
@@ -96,7 +100,7 @@ def load_json_schema(directory, path, schemas={}):
 
         descr['title'] = title
 
-    schemas[path] = definitions
+    schemas[key] = definitions
     return definitions
 
 JSON_TO_C = {
@@ -145,13 +149,16 @@ JSON_TO_SOL_JSON = {
     "number": "float"
 }
 
-def props_are_equivalent(p1, p2):
-    # This disconsiders comments
-    p1 = {k: get_type_from_property(v) for k, v in p1.items()}
-    p2 = {k: get_type_from_property(v) for k, v in p2.items()}
-    return p1 == p2
+def props_signature(props):
+    # This disconsiders comments; props with the same signature are equivalent
+    return frozenset((k, get_type_from_property(v)) for k, v in props.items())
+
+def prop_is_boolean(descr):
+    return 'enum' not in descr and descr.get('type') == 'boolean'
 
 def object_fields_common_c(state_struct_name, name, props):
+    # booleans are packed as 1-bit fields; generate_object() already sorts
+    # props by type, so they are adjacent and share storage units
     fields = []
     for prop_name, descr in props.items():
         doc = '/* %s */' % descr.get('short_description', '???')
@@ -160,10 +167,25 @@ def object_fields_common_c(state_struct_name, name, props):
         else:
             var_type = JSON_TO_C[descr['type']]
 
-        fields.append("%s %s; %s" % (var_type, prop_name, doc))
+        if prop_is_boolean(descr):
+            fields.append("%s %s : 1; %s" % (var_type, prop_name, doc))
+        else:
+            fields.append("%s %s; %s" % (var_type, prop_name, doc))
 
     return '\n'.join(fields)
 
+TO_REPR_VEC_FN_TMPL = Template('''static bool
+${struct_name}_to_repr_vec(void *data, struct sol_oic_map_writer *repr_map)
+{
+    struct ${struct_name} *state = (struct ${struct_name} *)data;
+    int r;
+
+    ${fields}
+
+    return true;
+}
+''')
+
 def generate_object_to_repr_vec_fn_common_c(state_struct_name, name, props, client):
     fields = []
     for prop_name, prop_descr in props.items():
@@ -213,21 +235,11 @@ def generate_object_to_repr_vec_fn_common_c(state_struct_name, name, props, clie
     if not fields:
         return ''
 
-    return '''static bool
-%(struct_name)s_to_repr_vec(void *data, struct sol_oic_map_writer *repr_map)
-{
-    struct %(struct_name)s *state = (struct %(struct_name)s *)data;
-    int r;
-
-    %(fields)s
-
-    return true;
-}
-''' % {
-    'type': 'client' if client else 'server',
-    'struct_name': name,
-    'fields': '\n'.join(fields)
-    }
+    return TO_REPR_VEC_FN_TMPL.substitute({
+        'type': 'client' if client else 'server',
+        'struct_name': name,
+        'fields': '\n'.join(fields)
+    })
 
 def get_type_from_property(prop):
     if 'type' in prop:
@@ -244,13 +256,14 @@ def all_props_are_read_only(props):
     return True
 
 
-def object_to_repr_vec_fn_common_c(state_struct_name, name, props, client, equivalent={}):
-    if client and all_props_are_read_only(props):
+def object_to_repr_vec_fn_common_c(state_struct_name, name, props, client, read_only, equivalent={}):
+    if client and read_only:
         return '';
 
-    for item_name, item_props in equivalent.items():
-        if item_props[0] == client and props_are_equivalent(props, item_props[1]):
-            return '''static bool
+    signature = (client, props_signature(props))
+    item_name = equivalent.get(signature)
+    if item_name:
+        return '''static bool
 %(struct_name)s_to_repr_vec(void *data, struct sol_oic_map_writer *repr_map_encoder)
 {
     return %(item_name)s_to_repr_vec(data, repr_map_encoder); /* %(item_name)s is equivalent to %(struct_name)s */
@@ -261,106 +274,102 @@ def object_to_repr_vec_fn_common_c(state_struct_name, name, props, client, equiv
         'type': 'client' if client else 'server'
     }
 
-    equivalent[name] = (client, props)
+    equivalent[signature] = name
     return generate_object_to_repr_vec_fn_common_c(state_struct_name, name, props, client)
 
-def object_to_repr_vec_fn_client_c(state_struct_name, name, props):
-    return object_to_repr_vec_fn_common_c(state_struct_name, name, props, True)
+def object_to_repr_vec_fn_client_c(state_struct_name, name, props, read_only):
+    return object_to_repr_vec_fn_common_c(state_struct_name, name, props, True, read_only)
 
-def object_to_repr_vec_fn_server_c(state_struct_name, name, props):
-    return object_to_repr_vec_fn_common_c(state_struct_name, name, props, False)
+def object_to_repr_vec_fn_server_c(state_struct_name, name, props, read_only):
+    return object_to_repr_vec_fn_common_c(state_struct_name, name, props, False, read_only)
 
-def get_field_integer_client_c(id, name, prop):
-    return '''
-        if (decode_mask & (1<<%(id)d) && streq(field.key, "%(field_name)s")) {
+GET_FIELD_INTEGER_TMPL = Template('''
+        case ${id}:
             if (field.type == SOL_OIC_REPR_TYPE_UINT)
-                fields.%(field_name)s = field.v_uint;
+                fields.${field_name} = field.v_uint;
             else if (field.type == SOL_OIC_REPR_TYPE_INT)
-                fields.%(field_name)s = field.v_int;
+                fields.${field_name} = field.v_int;
             else if (field.type == SOL_OIC_REPR_TYPE_SIMPLE)
-                fields.%(field_name)s = field.v_simple;
+                fields.${field_name} = field.v_simple;
             else
                 RETURN_ERROR(-EINVAL);
-            decode_mask &= ~(1<<%(id)d);
-            continue;
-        }
-''' % {
+            break;
+''')
+
+def get_field_integer_client_c(id, name, prop):
+    return GET_FIELD_INTEGER_TMPL.substitute({
         'field_name': name,
-        'field_name_len': len(name),
         'id': id
-    }
+    })
 
-def get_field_number_client_c(id, name, prop):
-    return '''
-        if (decode_mask & (1<<%(id)d) && streq(field.key, "%(field_name)s")) {
+GET_FIELD_NUMBER_TMPL = Template('''
+        case ${id}:
             if (field.type == SOL_OIC_REPR_TYPE_DOUBLE)
-                fields.%(field_name)s = field.v_double;
+                fields.${field_name} = field.v_double;
             else if (field.type == SOL_OIC_REPR_TYPE_FLOAT)
-                fields.%(field_name)s = field.v_float;
+                fields.${field_name} = field.v_float;
             else
                 RETURN_ERROR(-EINVAL);
-            decode_mask &= ~(1<<%(id)d);
-            continue;
-        }
-''' % {
+            break;
+''')
+
+def get_field_number_client_c(id, name, prop):
+    return GET_FIELD_NUMBER_TMPL.substitute({
         'field_name': name,
-        'field_name_len': len(name),
         'id': id
-    }
+    })
 
-def get_field_string_client_c(id, name, prop):
-    return '''
-        if (decode_mask & (1<<%(id)d) && streq(field.key, "%(field_name)s")) {
+GET_FIELD_STRING_TMPL = Template('''
+        case ${id}:
             if (field.type != SOL_OIC_REPR_TYPE_TEXT_STRING)
                 RETURN_ERROR(-EINVAL);
-            if (sol_util_replace_str_from_slice_if_changed(&fields.%(field_name)s, field.v_slice) < 0)
+            if (sol_util_replace_str_from_slice_if_changed(&fields.${field_name}, field.v_slice) < 0)
                 RETURN_ERROR(-EINVAL);
-            decode_mask &= ~(1<<%(id)d);
-            continue;
-        }
-''' % {
+            break;
+''')
+
+def get_field_string_client_c(id, name, prop):
+    return GET_FIELD_STRING_TMPL.substitute({
         'field_name': name,
-        'field_name_len': len(name),
         'id': id
-    }
+    })
 
-def get_field_boolean_client_c(id, name, prop):
-    return '''
-        if (decode_mask & (1<<%(id)d) && streq(field.key, "%(field_name)s")) {
+GET_FIELD_BOOLEAN_TMPL = Template('''
+        case ${id}:
             if (field.type != SOL_OIC_REPR_TYPE_BOOL)
                 RETURN_ERROR(-EINVAL);
-            fields.%(field_name)s = field.v_boolean;
-            decode_mask &= ~(1<<%(id)d);
-            continue;
-        }
-''' % {
+            fields.${field_name} = field.v_boolean;
+            break;
+''')
+
+def get_field_boolean_client_c(id, name, prop):
+    return GET_FIELD_BOOLEAN_TMPL.substitute({
         'field_name': name,
-        'field_name_len': len(name),
         'id': id
-    }
+    })
 
-def get_field_enum_client_c(id, struct_name, name, prop):
-    return '''
-        if (decode_mask & (1<<%(id)d) && streq(field.key, "%(field_name)s")) {
+GET_FIELD_ENUM_TMPL = Template('''
+        case ${id}: {
             int val;
 
             if (field.type != SOL_OIC_REPR_TYPE_TEXT_STRING)
                 RETURN_ERROR(-EINVAL);
 
-            val = sol_str_table_lookup_fallback(%(struct_name)s_%(field_name)s_tbl,
+            val = sol_str_table_lookup_fallback(${struct_name}_${field_name}_tbl,
                 field.v_slice, -1);
             if (val < 0)
                 RETURN_ERROR(-EINVAL);
-            fields.%(field_name)s = (enum %(struct_name)s_%(field_name)s)val;
-            decode_mask &= ~(1<<%(id)d);
-            continue;
+            fields.${field_name} = (enum ${struct_name}_${field_name})val;
+            break;
         }
-''' % {
+''')
+
+def get_field_enum_client_c(id, struct_name, name, prop):
+    return GET_FIELD_ENUM_TMPL.substitute({
         'struct_name': struct_name,
         'field_name': name,
-        'field_name_len': len(name),
         'id': id
-    }
+    })
 
 def object_fields_from_repr_vec(name, props):
     fields = []
@@ -378,6 +387,51 @@ def object_fields_from_repr_vec(name, props):
             fields.append(type_to_fn[prop['type']](id, prop_name, prop))
     return '\n'.join(fields)
 
+def object_fields_tbl_from_repr_vec(props):
+    return '\n'.join('        SOL_STR_TABLE_ITEM("%s", %d),' % (prop_name, id)
+        for id, prop_name in enumerate(props))
+
+FROM_REPR_VEC_FN_TMPL = Template('''static int
+${struct_name}_from_repr_vec(struct ${struct_name} *state,
+    const struct sol_oic_map_reader *repr_vec, uint32_t decode_mask)
+{
+    static const struct sol_str_table fields_tbl[] = {
+${fields_tbl}
+        { }
+    };
+    struct sol_oic_repr_field field;
+    enum sol_oic_map_loop_reason end_reason;
+    struct sol_oic_map_reader iterator;
+    struct ${struct_name} fields = {
+${fields_init}
+    };
+    bool updated = false;
+    int ret = 0;
+
+    SOL_OIC_MAP_LOOP(repr_vec, &field, &iterator, end_reason) {
+        int16_t id = sol_str_table_lookup_fallback(fields_tbl,
+            sol_str_slice_from_str(field.key), -1);
+
+        if (id < 0 || !(decode_mask & (1 << id)))
+            continue;
+
+        switch (id) {${fields}
+        }
+        decode_mask &= ~(1 << id);
+    }
+    if (end_reason != SOL_OIC_MAP_LOOP_OK)
+        goto out;
+
+${update_state}
+
+    ret = updated ? 1 : 0;
+
+out:
+${free_fields}
+    return ret;
+}
+''')
+
 def generate_object_from_repr_vec_fn_common_c(name, props):
     fields_init = []
     for field_name, field_props in props.items():
@@ -425,45 +479,20 @@ def generate_object_from_repr_vec_fn_common_c(name, props):
     }
 """)
 
-    return '''static int
-%(struct_name)s_from_repr_vec(struct %(struct_name)s *state,
-    const struct sol_oic_map_reader *repr_vec, uint32_t decode_mask)
-{
-    struct sol_oic_repr_field field;
-    enum sol_oic_map_loop_reason end_reason;
-    struct sol_oic_map_reader iterator;
-    struct %(struct_name)s fields = {
-%(fields_init)s
-    };
-    bool updated = false;
-    int ret = 0;
-
-    SOL_OIC_MAP_LOOP(repr_vec, &field, &iterator, end_reason) {
-%(fields)s
-    }
-    if (end_reason != SOL_OIC_MAP_LOOP_OK)
-        goto out;
-
-%(update_state)s
-
-    ret = updated ? 1 : 0;
-
-out:
-%(free_fields)s
-    return ret;
-}
-''' % {
+    return FROM_REPR_VEC_FN_TMPL.substitute({
         'struct_name': name,
         'fields_init': '\n'.join(fields_init),
         'fields': object_fields_from_repr_vec(name, props),
+        'fields_tbl': object_fields_tbl_from_repr_vec(props),
         'free_fields': '\n'.join(fields_free),
         'update_state': '\n'.join(update_state)
-    }
+    })
 
 def object_from_repr_vec_fn_common_c(name, props, equivalent={}):
-    for item_name, item_props in equivalent.items():
-        if props_are_equivalent(props, item_props):
-            return '''static int
+    signature = props_signature(props)
+    item_name = equivalent.get(signature)
+    if item_name:
+        return '''static int
 %(struct_name)s_from_repr_vec(struct %(struct_name)s *state,
     const struct sol_oic_map_reader *repr_map, uint32_t decode_mask)
 {
@@ -475,7 +504,7 @@ def object_from_repr_vec_fn_common_c(name, props, equivalent={}):
         'struct_name': name
     }
 
-    equivalent[name] = props
+    equivalent[signature] = name
     return generate_object_from_repr_vec_fn_common_c(name, props)
 
 
@@ -515,6 +544,7 @@ def object_from_repr_vec_fn_server_c(state_struct_name, name, props):
     }
 
 def object_inform_flow_fn_common_c(state_struct_name, name, props, client):
+    STRUCT_NAME = name.upper()
     send_flow_pkts = []
     for field_name, field_props in props.items():
         if 'enum' in field_props:
@@ -531,7 +561,7 @@ def object_inform_flow_fn_common_c(state_struct_name, name, props, client):
 
         send_flow_pkts.append('''%(flow_send_fn)s(resource->node, SOL_FLOW_NODE_TYPE_%(STRUCT_NAME)s__OUT__%(FIELD_NAME)s, %(val)s);''' % {
             'flow_send_fn': fn,
-            'STRUCT_NAME': name.upper(),
+            'STRUCT_NAME': STRUCT_NAME,
             'FIELD_NAME': get_port_name(field_name),
             'val': val
         })
@@ -550,11 +580,33 @@ def object_inform_flow_fn_common_c(state_struct_name, name, props, client):
 def object_inform_flow_fn_client_c(state_struct_name, name, props):
     return object_inform_flow_fn_common_c(state_struct_name, name, props, True)
 
-def object_inform_flow_fn_server_c(state_struct_name, name, props):
-    read_only = all(field_props['read_only'] for field_name, field_props in props.items())
+def object_inform_flow_fn_server_c(state_struct_name, name, props, read_only):
     return '' if read_only else object_inform_flow_fn_common_c(state_struct_name, name, props, False)
 
-def object_open_fn_client_c(state_struct_name, resource_type, name, props):
+OPEN_FN_CLIENT_TMPL = Template('''static int
+${struct_name}_open(struct sol_flow_node *node, void *data, const struct sol_flow_node_options *options)
+{
+    const struct sol_flow_node_type_${struct_name}_options *node_opts =
+        (const struct sol_flow_node_type_${struct_name}_options *)options;
+    static const struct client_resource_funcs funcs = {
+        .to_repr_vec = ${to_repr_vec_fn},
+        .from_repr_vec = ${struct_name}_from_repr_vec,
+        .inform_flow = ${struct_name}_inform_flow,
+        .found_port = SOL_FLOW_NODE_TYPE_${STRUCT_NAME}__OUT__FOUND,
+        .device_id_port = SOL_FLOW_NODE_TYPE_${STRUCT_NAME}__OUT__DEVICE_ID
+    };
+    struct ${struct_name} *resource = data;
+    int r;
+
+    r = client_resource_init(node, &resource->base, "${resource_type}", &funcs);
+    SOL_INT_CHECK(r, < 0, r);
+    ${field_init}
+
+    return client_connect(&resource->base, node_opts->device_id);
+}
+''')
+
+def object_open_fn_client_c(state_struct_name, resource_type, name, props, read_only):
     field_init = []
     for field_name, field_props in props.items():
         if 'enum' in field_props:
@@ -566,47 +618,45 @@ def object_open_fn_client_c(state_struct_name, resource_type, name, props):
             'init': init
         })
 
-    no_inputs = all(field_props['read_only'] for field_name, field_props in props.items())
-    if no_inputs:
+    if read_only:
         to_repr_vec_fn = 'NULL'
     else:
         to_repr_vec_fn = '%s_to_repr_vec' % name
 
-    return '''static int
-%(struct_name)s_open(struct sol_flow_node *node, void *data, const struct sol_flow_node_options *options)
-{
-    const struct sol_flow_node_type_%(struct_name)s_options *node_opts =
-        (const struct sol_flow_node_type_%(struct_name)s_options *)options;
-    static const struct client_resource_funcs funcs = {
-        .to_repr_vec = %(to_repr_vec_fn)s,
-        .from_repr_vec = %(struct_name)s_from_repr_vec,
-        .inform_flow = %(struct_name)s_inform_flow,
-        .found_port = SOL_FLOW_NODE_TYPE_%(STRUCT_NAME)s__OUT__FOUND,
-        .device_id_port = SOL_FLOW_NODE_TYPE_%(STRUCT_NAME)s__OUT__DEVICE_ID
-    };
-    struct %(struct_name)s *resource = data;
-    int r;
-
-    r = client_resource_init(node, &resource->base, "%(resource_type)s", &funcs);
-    SOL_INT_CHECK(r, < 0, r);
-    %(field_init)s
-
-    return client_connect(&resource->base, node_opts->device_id);
-}
-''' % {
+    return OPEN_FN_CLIENT_TMPL.substitute({
         'struct_name': name,
         'STRUCT_NAME': get_port_name(name),
         'resource_type': resource_type,
         'field_init': '\n'.join(field_init),
         'to_repr_vec_fn': to_repr_vec_fn
+    })
+
+OPEN_FN_SERVER_TMPL = Template('''static int
+${struct_name}_open(struct sol_flow_node *node, void *data, const struct sol_flow_node_options *options)
+{
+    static const struct sol_str_slice rt_slice = SOL_STR_SLICE_LITERAL("${resource_type}");
+    static const struct server_resource_funcs funcs = {
+        .to_repr_vec = ${struct_name}_to_repr_vec,
+        .from_repr_vec = ${from_repr_vec_fn_name},
+        .inform_flow = ${inform_flow_fn_name}
+    };
+    struct ${struct_name} *resource = data;
+    int r;
+
+    r = server_resource_init(&resource->base, node, rt_slice, &funcs);
+    if (!r) {
+        ${field_init}
     }
 
-def object_open_fn_server_c(state_struct_name, resource_type, name, props, definitions={'id':0}):
+    return r;
+}
+''')
+
+def object_open_fn_server_c(state_struct_name, resource_type, name, props, read_only, definitions={'id':0}):
     def_id = definitions['id']
     definitions['id'] += 1
 
-    no_inputs = all(field_props['read_only'] for field_name, field_props in props.items())
-    if no_inputs:
+    if read_only:
         from_repr_vec_fn_name = 'NULL'
         inform_flow_fn_name = 'NULL'
     else:
@@ -624,33 +674,14 @@ def object_open_fn_server_c(state_struct_name, resource_type, name, props, defin
             'init': init
         })
 
-    return '''static int
-%(struct_name)s_open(struct sol_flow_node *node, void *data, const struct sol_flow_node_options *options)
-{
-    static const struct sol_str_slice rt_slice = SOL_STR_SLICE_LITERAL("%(resource_type)s");
-    static const struct server_resource_funcs funcs = {
-        .to_repr_vec = %(struct_name)s_to_repr_vec,
-        .from_repr_vec = %(from_repr_vec_fn_name)s,
-        .inform_flow = %(inform_flow_fn_name)s
-    };
-    struct %(struct_name)s *resource = data;
-    int r;
-
-    r = server_resource_init(&resource->base, node, rt_slice, &funcs);
-    if (!r) {
-        %(field_init)s
-    }
-
-    return r;
-}
-''' % {
+    return OPEN_FN_SERVER_TMPL.substitute({
         'struct_name': name,
         'resource_type': resource_type,
         'def_id': def_id,
         'from_repr_vec_fn_name': from_repr_vec_fn_name,
         'inform_flow_fn_name': inform_flow_fn_name,
         'field_init': '\n'.join(field_init)
-    }
+    })
 
 def object_close_fn_client_c(name, props):
     destroy_fields = []
@@ -690,94 +721,98 @@ def object_close_fn_server_c(name, props):
         'destroy_fields': '\n'.join(destroy_fields)
     }
 
-def object_setters_fn_common_c(state_struct_name, name, props, client):
-    fields = []
-    for field, descr in props.items():
-        if client and descr['read_only']:
-            continue
-
-        if 'enum' in descr:
-            fields.append('''static int
-%(struct_name)s_set_%(field_name)s(struct sol_flow_node *node, void *data, uint16_t port,
+SETTER_ENUM_TMPL = Template('''static int
+${struct_name}_set_${field_name}(struct sol_flow_node *node, void *data, uint16_t port,
     uint16_t conn_id, const struct sol_flow_packet *packet)
 {
-    struct %(struct_name)s *resource = data;
+    struct ${struct_name} *resource = data;
     const char *var;
 
     if (!sol_flow_packet_get_string(packet, &var)) {
-        int16_t val = sol_str_table_lookup_fallback(%(state_struct_name)s_%(field_name)s_tbl,
+        int16_t val = sol_str_table_lookup_fallback(${state_struct_name}_${field_name}_tbl,
             sol_str_slice_from_str(var), -1);
         if (val >= 0) {
-            resource->state.%(field_name)s = (enum %(state_struct_name)s_%(field_name)s)val;
-            %(type)s_resource_schedule_update(&resource->base);
+            resource->state.${field_name} = (enum ${state_struct_name}_${field_name})val;
+            ${type}_resource_schedule_update(&resource->base);
             return 0;
         }
         return -ENOENT;
     }
     return -EINVAL;
 }
-''' % {
-        'field_name': field,
-        'FIELD_NAME': field.upper(),
-        'state_struct_name': state_struct_name,
-        'STATE_STRUCT_NAME': state_struct_name.upper(),
-        'struct_name': name,
-        'type': 'client' if client else 'server'
-    })
+''')
 
-        elif descr['type'] == 'string':
-            fields.append('''static int
-%(struct_name)s_set_%(field_name)s(struct sol_flow_node *node, void *data, uint16_t port,
+SETTER_STRING_TMPL = Template('''static int
+${struct_name}_set_${field_name}(struct sol_flow_node *node, void *data, uint16_t port,
     uint16_t conn_id, const struct sol_flow_packet *packet)
 {
-    struct %(struct_name)s *resource = data;
+    struct ${struct_name} *resource = data;
     const char *var;
     int r;
 
     r = sol_flow_packet_get_string(packet, &var);
     if (!r) {
-        r = sol_util_replace_str_if_changed(&resource->state.%(field_name)s, var);
+        r = sol_util_replace_str_if_changed(&resource->state.${field_name}, var);
         SOL_INT_CHECK(r, < 0, r);
         if (r > 0) {
-            %(type)s_resource_schedule_update(&resource->base);
+            ${type}_resource_schedule_update(&resource->base);
             r = 0;
         }
     }
     return r;
 }
-''' % {
-        'struct_name': name,
-        'field_name': field,
-        'type': 'client' if client else 'server'
-    })
+''')
 
-        else:
-            fields.append('''static int
-%(struct_name)s_set_%(field_name)s(struct sol_flow_node *node, void *data, uint16_t port,
+SETTER_TMPL = Template('''static int
+${struct_name}_set_${field_name}(struct sol_flow_node *node, void *data, uint16_t port,
     uint16_t conn_id, const struct sol_flow_packet *packet)
 {
-    struct %(struct_name)s *resource = data;
-    %(c_type_tmp)s var;
+    struct ${struct_name} *resource = data;
+    ${c_type_tmp} var;
     int r;
 
-    r = %(c_getter)s(packet, &var);
+    r = ${c_getter}(packet, &var);
     if (!r) {
-        if (%(c_check_updated)s(resource->state.%(field_name)s, (%(c_type)s) var)) {
-            resource->state.%(field_name)s = (%(c_type)s) var;
-            %(type)s_resource_schedule_update(&resource->base);
+        if (${c_check_updated}(resource->state.${field_name}, (${c_type}) var)) {
+            resource->state.${field_name} = (${c_type}) var;
+            ${type}_resource_schedule_update(&resource->base);
         }
     }
     return r;
 }
-''' % {
-        'struct_name': name,
-        'field_name': field,
-        'c_type': JSON_TO_C[descr['type']],
-        'c_type_tmp': JSON_TO_C_TMP[descr['type']],
-        'c_getter': JSON_TO_FLOW_GET_PKT[descr['type']],
-        'c_check_updated': JSON_TO_FLOW_CHECK_UPDATED[descr['type']],
-        'type': 'client' if client else 'server'
-    })
+''')
+
+def object_setters_fn_common_c(state_struct_name, name, props, client):
+    fields = []
+    for field, descr in props.items():
+        if client and descr['read_only']:
+            continue
+
+        if 'enum' in descr:
+            fields.append(SETTER_ENUM_TMPL.substitute({
+                'field_name': field,
+                'state_struct_name': state_struct_name,
+                'struct_name': name,
+                'type': 'client' if client else 'server'
+            }))
+
+        elif descr['type'] == 'string':
+            fields.append(SETTER_STRING_TMPL.substitute({
+                'struct_name': name,
+                'field_name': field,
+                'type': 'client' if client else 'server'
+            }))
+
+        else:
+            fields.append(SETTER_TMPL.substitute({
+                'struct_name': name,
+                'field_name': field,
+                'c_type': JSON_TO_C[descr['type']],
+                'c_type_tmp': JSON_TO_C_TMP[descr['type']],
+                'c_getter': JSON_TO_FLOW_GET_PKT[descr['type']],
+                'c_check_updated': JSON_TO_FLOW_CHECK_UPDATED[descr['type']],
+                'type': 'client' if client else 'server'
+            }))
 
     return '\n'.join(fields)
 
@@ -788,15 +823,18 @@ def object_setters_fn_server_c(state_struct_name, name, props):
     return object_setters_fn_common_c(state_struct_name, name, props, False)
 
 def generate_enums_common_c(name, props):
+    NAME = name.upper()
     output = []
     for field, descr in props.items():
         if 'enum' in descr:
+            FIELD = field.upper()
+            items = [remove_special_chars(item) for item in descr['enum']]
             if 'short_description' in descr:
                 output.append('''/* %s */''' % descr['short_description'])
             output.append('''enum %(struct_name)s_%(field_name)s { %(items)s };''' % {
                 'struct_name': name,
                 'field_name': field,
-                'items': ', '.join(('%s_%s_%s' % (name, field, remove_special_chars(item))).upper() for item in descr['enum'])
+                'items': ', '.join('%s_%s_%s' % (NAME, FIELD, item.upper()) for item in items)
             })
 
             output.append('''static const struct sol_str_table %(struct_name)s_%(field_name)s_tbl[] = {
@@ -806,56 +844,62 @@ def generate_enums_common_c(name, props):
                 'struct_name': name,
                 'field_name': field,
                 'items': ',\n'.join('SOL_STR_TABLE_ITEM(\"%s\", %s_%s_%s)' % (
-                    remove_special_chars(item), name.upper(), field.upper(), remove_special_chars(item).upper()) for item in descr['enum'])
+                    item, NAME, FIELD, item.upper()) for item in items)
             })
 
     return '\n'.join(output)
 
-def generate_object_client_c(resource_type, state_struct_name, name, props):
-    return """struct %(struct_name)s {
+OBJECT_CLIENT_TMPL = Template("""struct ${struct_name} {
     struct client_resource base;
-    struct %(state_struct_name)s state;
+    struct ${state_struct_name} state;
 };
 
-%(to_repr_vec_fn)s
-%(from_repr_vec_fn)s
-%(inform_flow_fn)s
-%(open_fn)s
-%(close_fn)s
-%(setters_fn)s
-""" % {
-    'state_struct_name': state_struct_name,
-    'struct_name': name,
-    'to_repr_vec_fn': object_to_repr_vec_fn_client_c(state_struct_name, name, props),
-    'from_repr_vec_fn': object_from_repr_vec_fn_client_c(state_struct_name, name, props),
-    'inform_flow_fn': object_inform_flow_fn_client_c(state_struct_name, name, props),
-    'open_fn': object_open_fn_client_c(state_struct_name, resource_type, name, props),
-    'close_fn': object_close_fn_client_c(name, props),
-    'setters_fn': object_setters_fn_client_c(state_struct_name, name, props),
-    }
+${to_repr_vec_fn}
+${from_repr_vec_fn}
+${inform_flow_fn}
+${open_fn}
+${close_fn}
+${setters_fn}
+""")
 
-def generate_object_server_c(resource_type, state_struct_name, name, props):
-    return """struct %(struct_name)s {
+def generate_object_client_c(resource_type, state_struct_name, name, props):
+    read_only = all_props_are_read_only(props)
+    return OBJECT_CLIENT_TMPL.substitute({
+        'state_struct_name': state_struct_name,
+        'struct_name': name,
+        'to_repr_vec_fn': object_to_repr_vec_fn_client_c(state_struct_name, name, props, read_only),
+        'from_repr_vec_fn': object_from_repr_vec_fn_client_c(state_struct_name, name, props),
+        'inform_flow_fn': object_inform_flow_fn_client_c(state_struct_name, name, props),
+        'open_fn': object_open_fn_client_c(state_struct_name, resource_type, name, props, read_only),
+        'close_fn': object_close_fn_client_c(name, props),
+        'setters_fn': object_setters_fn_client_c(state_struct_name, name, props),
+    })
+
+OBJECT_SERVER_TMPL = Template("""struct ${struct_name} {
     struct server_resource base;
-    struct %(state_struct_name)s state;
+    struct ${state_struct_name} state;
 };
 
-%(to_repr_vec_fn)s
-%(from_repr_vec_fn)s
-%(inform_flow_fn)s
-%(open_fn)s
-%(close_fn)s
-%(setters_fn)s
-""" % {
-    'struct_name': name,
-    'state_struct_name': state_struct_name,
-    'to_repr_vec_fn': object_to_repr_vec_fn_server_c(state_struct_name, name, props),
-    'from_repr_vec_fn': object_from_repr_vec_fn_server_c(state_struct_name, name, props),
-    'inform_flow_fn': object_inform_flow_fn_server_c(state_struct_name, name, props),
-    'open_fn': object_open_fn_server_c(state_struct_name, resource_type, name, props),
-    'close_fn': object_close_fn_server_c(name, props),
-    'setters_fn': object_setters_fn_server_c(state_struct_name, name, props)
-    }
+${to_repr_vec_fn}
+${from_repr_vec_fn}
+${inform_flow_fn}
+${open_fn}
+${close_fn}
+${setters_fn}
+""")
+
+def generate_object_server_c(resource_type, state_struct_name, name, props):
+    read_only = all_props_are_read_only(props)
+    return OBJECT_SERVER_TMPL.substitute({
+        'struct_name': name,
+        'state_struct_name': state_struct_name,
+        'to_repr_vec_fn': object_to_repr_vec_fn_server_c(state_struct_name, name, props, read_only),
+        'from_repr_vec_fn': object_from_repr_vec_fn_server_c(state_struct_name, name, props),
+        'inform_flow_fn': object_inform_flow_fn_server_c(state_struct_name, name, props, read_only),
+        'open_fn': object_open_fn_server_c(state_struct_name, resource_type, name, props, read_only),
+        'close_fn': object_close_fn_server_c(name, props),
+        'setters_fn': object_setters_fn_server_c(state_struct_name, name, props)
+    })
 
 def generate_object_common_c(name, props):
     return """%(enums)s
@@ -974,9 +1018,6 @@ def generate_object_json(resource_type, struct_name, node_name, title, props, se
     return output
 
 def generate_object(rt, title, props, json_name):
-    def type_value(item):
-        return '%s %s' % (get_type_from_property(item[1]), item[0])
-
     resource_type = rt
 
     if rt.startswith('oic.r.'):
@@ -995,12 +1036,14 @@ def generate_object(rt, title, props, json_name):
     server_struct_name = "%s_server_%s" % (c_json_name, c_identifier)
     state_struct_name = "%s_state_%s" % (c_json_name, c_identifier)
 
-    new_props = OrderedDict()
-    for k, v in sorted(props.items(), key=type_value):
-        new_props[remove_special_chars(k)] = v
-    props = new_props
+    # sort by (type, name); property names are unique, so the dicts are
+    # never compared
+    decorated = [(get_type_from_property(v), k, v) for k, v in props.items()]
+    decorated.sort()
+    props = OrderedDict((remove_special_chars(k), v) for _, k, v in decorated)
 
     retval = {
+        'c_identifier': c_identifier,
         'c_common': generate_object_common_c(state_struct_name, props),
         'c_client': generate_object_client_c(resource_type, state_struct_name, client_struct_name, props),
         'c_server': generate_object_server_c(resource_type, state_struct_name, server_struct_name, props),
@@ -1031,18 +1074,16 @@ def master_json_as_string(generated, json_name):
         },
         'types': [t['json_server'] for t in generated] + [t['json_client'] for t in generated]
     }
-    return json.dumps(master_json, indent=4)
+    # compact output keeps json.dumps() on the C encoder; the file is only
+    # consumed by sol-flow-node-type-gen
+    return json.dumps(master_json, separators=(',', ':'), ensure_ascii=False)
 
-def master_c_as_string(generated, oic_gen_c, oic_gen_h):
-    generated = list(generated)
-    code = '''
+MASTER_C_HEADER = Template('''
 #include <assert.h>
 #include <errno.h>
-#include <math.h>
-#include <stdio.h>
 #include <stdlib.h>
 
-#include "%(oic_gen_h)s"
+#include "${oic_gen_h}"
 
 #include "sol-coap.h"
 #include "sol-mainloop.h"
@@ -1062,8 +1103,6 @@ def master_c_as_string(generated, oic_gen_c, oic_gen_h):
 
 #define DEVICE_ID_LEN (16)
 
-#define streq(a, b) (strcmp((a), (b)) == 0)
-#define likely(x)   __builtin_expect(!!(x), 1)
 
 struct client_resource;
 struct server_resource;
@@ -1180,7 +1219,7 @@ state_changed(void *data, enum sol_coap_response_code response_code, struct sol_
             return;
         }
 
-        SOL_WRN("Expecting response from %%.*s, got from %%.*s, ignoring",
+        SOL_WRN("Expecting response from %.*s, got from %.*s, ignoring",
             SOL_STR_SLICE_PRINT(sol_buffer_get_slice(&resaddr)),
             SOL_STR_SLICE_PRINT(sol_buffer_get_slice(&respaddr)));
         return;
@@ -1207,7 +1246,7 @@ found_resource(void *data, struct sol_oic_client *oic_cli, struct sol_oic_resour
         goto cancel;
     }
 
-    if (memcmp(oic_res->device_id.data, resource->device_id, 16) != 0) {
+    if (memcmp(oic_res->device_id.data, resource->device_id, DEVICE_ID_LEN) != 0) {
         /* Not the droid we're looking for. */
         SOL_DBG("Received resource with an unknown device_id, ignoring");
         return true;
@@ -1215,7 +1254,7 @@ found_resource(void *data, struct sol_oic_client *oic_cli, struct sol_oic_resour
 
     /* FIXME: Should this check move to sol-oic-client? Does it actually make sense? */
     if (resource->rt && !client_resource_implements_type(oic_res, resource->rt)) {
-        SOL_DBG("Received resource that does not implement rt=%%s, ignoring", resource->rt);
+        SOL_DBG("Received resource that does not implement rt=%s, ignoring", resource->rt);
         return true;
     }
 
@@ -1296,34 +1335,19 @@ find_timer(void *data)
     return true;
 }
 
-static inline char
-base16_encode_digit(const uint8_t nibble, const char a)
-{
-    if (likely(nibble < 10))
-        return '0' + nibble;
-    return a + (nibble - 10);
-}
-
 static void
 binary_to_hex_ascii(const char *binary, char *ascii)
 {
+    static const char digits[] = "0123456789abcdef";
     const uint8_t *input = (const uint8_t *)binary;
-    size_t i, o = 0;
+    size_t i;
 
     for (i = 0; i < DEVICE_ID_LEN; i++) {
-        const uint8_t b = input[i];
-        uint8_t n;
-
-        const uint8_t nibble[2] = {
-            (b & 0xf0) >> 4,
-            (b & 0x0f)
-        };
-
-        for (n = 0; n < 2; n++)
-            ascii[o++] = base16_encode_digit(nibble[n], 'a');
+        *ascii++ = digits[input[i] >> 4];
+        *ascii++ = digits[input[i] & 0x0f];
     }
 
-    ascii[o] = 0;
+    *ascii = 0;
 }
 
 static bool
@@ -1342,7 +1366,7 @@ scan_callback(void *data, struct sol_oic_client *oic_cli, struct sol_oic_resourc
 
     /* FIXME: Should this check move to sol-oic-client? Does it actually make sense? */
     if (resource->rt && !client_resource_implements_type(oic_res, resource->rt)) {
-        SOL_DBG("Received resource that does not implement rt=%%s, ignoring", resource->rt);
+        SOL_DBG("Received resource that does not implement rt=%s, ignoring", resource->rt);
         return true;
     }
 
@@ -1531,7 +1555,7 @@ as_nibble(const char c)
     if (c >= 'A' && c <= 'F')
         return c - 'A' + 10;
 
-    SOL_WRN("Invalid hex character: %%d", c);
+    SOL_WRN("Invalid hex character: %d", c);
     return 0;
 }
 
@@ -1569,7 +1593,7 @@ client_connect(struct client_resource *resource, const char *device_id)
         resource->resource = NULL;
     }
 
-    SOL_INF("Sending multicast packets to find resource with device_id %%s (rt=%%s)",
+    SOL_INF("Sending multicast packets to find resource with device_id %s (rt=%s)",
         device_id, resource->rt);
     resource->find_timeout = sol_timeout_add(FIND_PERIOD_MS, find_timer, resource);
     if (resource->find_timeout) {
@@ -1755,22 +1779,37 @@ send_string_packet(struct sol_flow_node *src, uint16_t src_port, const char *val
 
 #define RETURN_ERROR(errcode) do { ret = errcode; goto out; } while(0)
 
-%(generated_c_common)s
-%(generated_c_client)s
-%(generated_c_server)s
+''')
 
-#undef RETURN_ERROR
+MASTER_C_FOOTER = Template('''
 
-#include "%(oic_gen_c)s"
-''' % {
-        'generated_c_common': '\n'.join(t['c_common'] for t in generated),
-        'generated_c_client': '\n'.join(t['c_client'] for t in generated),
-        'generated_c_server': '\n'.join(t['c_server'] for t in generated),
-        'oic_gen_c': oic_gen_c,
-        'oic_gen_h': oic_gen_h,
-    }
+#undef RETURN_ERROR
 
-    return code.replace('\n\n\n', '\n')
+#include "${oic_gen_c}"
+''')
+
+def master_c_chunks(generated, oic_gen_c, oic_gen_h):
+    yield MASTER_C_HEADER.substitute({'oic_gen_h': oic_gen_h})
+    for section in ('c_common', 'c_client', 'c_server'):
+        sep = ''
+        for t in generated:
+            yield sep
+            yield t[section]
+            sep = '\n'
+        if section != 'c_server':
+            yield '\n'
+    yield MASTER_C_FOOTER.substitute({'oic_gen_c': oic_gen_c})
+
+def write_master_c(generated, oic_gen_c, oic_gen_h, fp):
+    # collapse '\n\n\n' runs like str.replace() would on the whole file;
+    # trailing newlines are held back since a run may span two chunks
+    pending = ''
+    for chunk in master_c_chunks(generated, oic_gen_c, oic_gen_h):
+        chunk = pending + chunk
+        body = chunk.rstrip('\n')
+        pending = chunk[len(body):]
+        fp.write(body.replace('\n\n\n', '\n'))
+    fp.write(pending.replace('\n\n\n', '\n'))
 
 if __name__ == '__main__':
     import argparse
@@ -1814,14 +1853,24 @@ if __name__ == '__main__':
         json_name = json_name[:-5]
 
     generated = []
+    c_identifiers = set()
     warn('Generating code for schemas: ', end='')
     for schema_dir in pargs.schema_dirs:
-        for path in (f for f in sorted(os.listdir(schema_dir)) if seems_schema(f)):
+        paths = sorted(entry.name for entry in os.scandir(schema_dir)
+                       if seems_schema(entry.name) and entry.is_file())
+        for path in paths:
             warn(path, end=', ')
 
             try:
                 for code in generate_for_schema(schema_dir, path, \
                         json_name):
+                    # the same resource type may come from more than one
+                    # schema; its C symbols and node types would clash
+                    if code['c_identifier'] in c_identifiers:
+                        warn("(duplicate %s ignored)" % code['c_identifier'],
+                             end=' ')
+                        continue
+                    c_identifiers.add(code['c_identifier'])
                     generated.append(code)
             except KeyError as e:
                 if e.args[0] in ('array', 'object'):
@@ -1836,13 +1885,14 @@ if __name__ == '__main__':
                 continue
 
     warn('\nWriting master JSON: %s' % pargs.node_type_json)
-    open(pargs.node_type_json, 'w+', encoding='UTF-8').write(
-            master_json_as_string(generated, json_name))
+    with open(pargs.node_type_json, 'w', encoding='UTF-8') as fp:
+        fp.write(master_json_as_string(generated, json_name))
 
     warn('Writing C: %s' % pargs.node_type_impl)
-    open(pargs.node_type_impl, 'w+', encoding='UTF-8').write(
-            master_c_as_string(generated, pargs.node_type_gen_c,
-            pargs.node_type_gen_h))
+    with open(pargs.node_type_impl, 'w', encoding='UTF-8',
+              buffering=1 << 20) as fp:
+        write_master_c(generated, pargs.node_type_gen_c,
+                       pargs.node_type_gen_h, fp)
     if os.path.exists('/usr/bin/indent'):
         warn('Indenting generated C.')
         os.system("/usr/bin/indent -kr -l120 '%s'" % pargs.node_type_impl)
@@ -33,7 +33,18 @@
 #include <float.h>
 #include <math.h>
 
-static const char sol_json_escapable_chars[] = { '\\', '\"', '/', '\b', '\f', '\n', '\r', '\t' };
+/* maps a character to the one following '\\' in its escaped form, 0 if
+ * it doesn't need escaping */
+static const char sol_json_escape_chars[256] = {
+    ['\\'] = '\\',
+    ['"'] = '"',
+    ['/'] = '/',
+    ['\b'] = 'b',
+    ['\f'] = 'f',
+    ['\n'] = 'n',
+    ['\r'] = 'r',
+    ['\t'] = 't',
+};
 
 static bool
 check_symbol(struct sol_json_scanner *scanner, struct sol_json_token *token,
@@ -586,7 +597,7 @@ sol_json_calculate_escaped_string_len(const char *str)
     SOL_NULL_CHECK(str, 0);
 
     for (; *str; str++) {
-        if (memchr(sol_json_escapable_chars, *str, sizeof(sol_json_escapable_chars)))
+        if (sol_json_escape_chars[(uint8_t)*str])
             len++;
         len++;
     }
@@ -611,18 +622,11 @@ sol_json_escape_string(const char *str, struct sol_buffer *buf)
     r_str = out = sol_buffer_at_end(buf);
 
     for (i = 0; *str && i < escaped_len; str++, i++) {
-        if (memchr(sol_json_escapable_chars, *str, sizeof(sol_json_escapable_chars))) {
+        const char escaped = sol_json_escape_chars[(uint8_t)*str];
+
+        if (escaped) {
             *out++ = '\\';
-            switch (*str) {
-            case '"':  *out++ = '"'; break;
-            case '\\': *out++ = '\\'; break;
-            case '/':  *out++ = '/'; break;
-            case '\b': *out++ = 'b'; break;
-            case '\f': *out++ = 'f'; break;
-            case '\n': *out++ = 'n'; break;
-            case '\r': *out++ = 'r'; break;
-            case '\t': *out++ = 't'; break;
-            }
+            *out++ = escaped;
         } else {
             *out++ = *str;
         }
@@ -567,6 +567,40 @@ test_json_token_get_double(void)
     }
 }
 
+DEFINE_TEST(test_json_escape_string);
+
+static void
+test_json_escape_string(void)
+{
+    static const struct {
+        const char *str;
+        const char *escaped;
+    } table[] = {
+        { "", "" },
+        { "no escapes here", "no escapes here" },
+        { "\"quoted\"", "\\\"quoted\\\"" },
+        { "back\\slash/slash", "back\\\\slash\\/slash" },
+        { "\b\f\n\r\t", "\\b\\f\\n\\r\\t" },
+        { "\x01\x7f\xc3\xa1", "\x01\x7f\xc3\xa1" },
+    };
+    unsigned int i;
+
+    for (i = 0; i < sol_util_array_size(table); i++) {
+        struct sol_buffer buf = SOL_BUFFER_INIT_EMPTY;
+        const char *escaped;
+
+        ASSERT_INT_EQ(sol_json_calculate_escaped_string_len(table[i].str),
+            strlen(table[i].escaped) + 1);
+
+        escaped = sol_json_escape_string(table[i].str, &buf);
+        ASSERT(escaped);
+        ASSERT_STR_EQ(escaped, table[i].escaped);
+        ASSERT_INT_EQ(buf.used, strlen(table[i].escaped));
+
+        sol_buffer_fini(&buf);
+    }
+}
+
 DEFINE_TEST(test_json_serialize_memdesc);
 static void
 test_json_serialize_memdesc(void)